@@ -1,7 +1,7 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import List
-import os
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -12,6 +12,11 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str = ""
     MONGODB_DB_NAME: str = "carbon_watch"
+    MONGODB_MAX_POOL_SIZE: int = 50
+    MONGODB_MIN_POOL_SIZE: int = 5
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 3000
+    # Wire compression codecs in preference order (zstd needs `zstandard`)
+    MONGODB_COMPRESSORS: str = "zstd,zlib"
     
     # JWT
     SECRET_KEY: str = ""
@@ -21,19 +26,24 @@ class Settings(BaseSettings):
     
     # CORS - accepts comma-separated origins in env var
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
+    # Production origins, comma-separated; merged into CORS_ORIGINS
+    EXTRA_CORS_ORIGINS: str = ""
+    # Optional regex (full match) for origin families, e.g. preview deployments
+    CORS_ORIGIN_REGEX: Optional[str] = None
     
     class Config:
         env_file = ".env"
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Allow adding production origins via EXTRA_CORS_ORIGINS env var
-        extra_origins = os.getenv("EXTRA_CORS_ORIGINS", "")
-        if extra_origins:
-            for origin in extra_origins.split(","):
-                origin = origin.strip()
-                if origin and origin not in self.CORS_ORIGINS:
-                    self.CORS_ORIGINS.append(origin)
+    @model_validator(mode="after")
+    def merge_extra_cors_origins(self) -> "Settings":
+        """Append EXTRA_CORS_ORIGINS to CORS_ORIGINS, skipping duplicates."""
+        origins = list(self.CORS_ORIGINS)
+        for origin in self.EXTRA_CORS_ORIGINS.split(","):
+            origin = origin.strip()
+            if origin and origin not in origins:
+                origins.append(origin)
+        self.CORS_ORIGINS = origins
+        return self
 
 
 @lru_cache()
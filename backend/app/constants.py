@@ -3,8 +3,18 @@ Centralized constants for Carbon Watch.
 All category definitions, carbon factors, and keyword lists in one place.
 """
 
+import re
+import sys
+from bisect import bisect_right
+from enum import IntEnum
+from types import MappingProxyType
 from typing import Literal
 
+try:
+    import ahocorasick
+except ImportError:  # Optional C extension; matching falls back to substring scans
+    ahocorasick = None
+
 # =============================================================================
 # CATEGORIES
 # =============================================================================
@@ -12,6 +22,10 @@ from typing import Literal
 CATEGORIES = ["Travel", "Food", "Shopping", "Electricity", "Gas", "Water", "Home"]
 Category = Literal["Travel", "Food", "Shopping", "Electricity", "Gas", "Water", "Home"]
 
+# Integer code per category (0..6, in CATEGORIES order) for compact in-memory
+# tables. Documents and API payloads keep the category name.
+CategoryCode = IntEnum("CategoryCode", CATEGORIES, start=0)
+
 
 # =============================================================================
 # CARBON EMISSION FACTORS (kg CO2 per INR spent)
@@ -87,6 +101,10 @@ MERCHANT_FACTORS = {
     "water bill": 0.00006,
 }
 
+# Freeze both factor tables as read-only views with interned keys
+CARBON_FACTORS = MappingProxyType({sys.intern(k): v for k, v in CARBON_FACTORS.items()})
+MERCHANT_FACTORS = MappingProxyType({sys.intern(k): v for k, v in MERCHANT_FACTORS.items()})
+
 
 # =============================================================================
 # CATEGORIZATION KEYWORDS
@@ -105,6 +123,9 @@ IGNORE_KEYWORDS = [
     "salary credit", "credit interest",
 ]
 
+# All ignore keywords as one alternation, scanned once per (lowercased) name
+IGNORE_REGEX = re.compile("|".join(map(re.escape, IGNORE_KEYWORDS)))
+
 # Category-specific keywords for transaction categorization
 CATEGORY_KEYWORDS = {
     "Travel": [
@@ -152,11 +173,68 @@ CATEGORY_KEYWORDS = {
 }
 
 
+# =============================================================================
+# NORMALIZED KEYWORD TABLES
+# Lowercased and interned once so matching never re-normalizes keywords.
+# =============================================================================
+
+# Merchant keys in MERCHANT_FACTORS order (first match wins)
+ALL_MERCHANT_KEYS = tuple(sys.intern(k.lower()) for k in MERCHANT_FACTORS)
+ALL_MERCHANT_FACTORS = tuple(MERCHANT_FACTORS.values())
+
+CATEGORY_KEYWORD_SETS = MappingProxyType({
+    category: frozenset(sys.intern(k.lower()) for k in keywords)
+    for category, keywords in CATEGORY_KEYWORDS.items()
+})
+
+
+# =============================================================================
+# KEYWORD AUTOMATON
+# One Aho-Corasick pass over a lowercased name finds every ignore keyword,
+# category keyword and merchant key it contains. Payload per keyword:
+#   (category_rank, category, merchant_rank, merchant_factor, ignored)
+# Ranks follow dict order so callers can reproduce first-match precedence.
+# =============================================================================
+
+def _build_keyword_automaton():
+    """Build the shared keyword automaton, or None if pyahocorasick is missing."""
+    if ahocorasick is None:
+        return None
+
+    payloads = {}
+    for keyword in IGNORE_KEYWORDS:
+        payloads.setdefault(keyword, [None, None, None, None, False])[4] = True
+    
+    for rank, (category, keywords) in enumerate(CATEGORY_KEYWORD_SETS.items()):
+        for keyword in keywords:
+            entry = payloads.setdefault(keyword, [None, None, None, None, False])
+            if entry[0] is None:
+                entry[0], entry[1] = rank, category
+
+    for rank, (merchant, factor) in enumerate(zip(ALL_MERCHANT_KEYS, ALL_MERCHANT_FACTORS)):
+        entry = payloads.setdefault(merchant, [None, None, None, None, False])
+        entry[2], entry[3] = rank, factor
+
+    automaton = ahocorasick.Automaton()
+    for keyword, entry in payloads.items():
+        automaton.add_word(keyword, tuple(entry))
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
 # =============================================================================
 # GAMIFICATION (simplified)
 # =============================================================================
 
-XP_THRESHOLDS = [0, 50, 150, 300, 500, 750, 1000, 1500, 2000, 3000, 5000]
+XP_THRESHOLDS = (0, 50, 150, 300, 500, 750, 1000, 1500, 2000, 3000, 5000)
+
+
+def xp_to_level(xp: int) -> int:
+    """Return the 1-based level for an XP total (highest threshold reached)."""
+    return max(1, bisect_right(XP_THRESHOLDS, xp))
 
 # Default goals
 DEFAULT_WEEKLY_GOAL = 50  # kg CO2
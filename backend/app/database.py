@@ -1,6 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from app.config import settings
+from app.models.user import User
+from app.models.transaction import Transaction
 
 
 # MongoDB client
@@ -10,11 +12,13 @@ client: AsyncIOMotorClient = None
 async def init_db():
     """Initialize MongoDB connection and Beanie ODM."""
     global client
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
-    
-    # Import models here to avoid circular imports
-    from app.models.user import User
-    from app.models.transaction import Transaction
+    client = AsyncIOMotorClient(
+        settings.MONGODB_URL,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        compressors=settings.MONGODB_COMPRESSORS,
+    )
     
     await init_beanie(
         database=client[settings.MONGODB_DB_NAME],
@@ -1,16 +1,21 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from app.config import settings
 from app.database import init_db, close_db
+from app.services.carbon import preload_ml_model
 from app.routers import auth, transactions, dashboard, insights, progress
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup and close on shutdown."""
-    await init_db()
+    """Initialize database and ML model on startup and close on shutdown."""
+    # Unpickling the classifier takes a while; do it in a thread alongside
+    # the database setup instead of on the first import request
+    await asyncio.gather(init_db(), asyncio.to_thread(preload_ml_model))
     yield
     await close_db()
 
@@ -23,15 +28,19 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Configure CORS
+# Configure CORS (origins are checked per request, so use a set)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
+    allow_origins=frozenset(settings.CORS_ORIGINS),
+    allow_origin_regex=settings.CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Compress JSON bodies (recommendation text and chart data compress well)
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(dashboard.router, prefix="/api")
@@ -1,5 +1,6 @@
-from beanie import Document, Indexed, PydanticObjectId
+from beanie import Document, PydanticObjectId
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from datetime import datetime
 from typing import Optional
 
@@ -7,11 +8,11 @@ from app.constants import Category
 
 
 class Transaction(Document):
-    user_id: Indexed(PydanticObjectId)
+    user_id: PydanticObjectId
     name: str
     description: Optional[str] = None
     category: Category
-    date: Indexed(datetime)
+    date: datetime
     amount: float
     carbon: float  # kg CO2
     source: str = "manual"  # manual, import
@@ -20,6 +21,19 @@ class Transaction(Document):
     
     class Settings:
         name = "transactions"
+        indexes = [
+            # Date-range totals and trends
+            IndexModel([("user_id", ASCENDING), ("date", ASCENDING)]),
+            # Category breakdown; covers the projected $group on category
+            IndexModel([
+                ("user_id", ASCENDING),
+                ("category", ASCENDING),
+                ("carbon", ASCENDING),
+                ("amount", ASCENDING),
+            ]),
+            # Category-filtered transaction lists and totals, newest first
+            IndexModel([("user_id", ASCENDING), ("category", ASCENDING), ("date", DESCENDING)]),
+        ]
         
     class Config:
         json_schema_extra = {
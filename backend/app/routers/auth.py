@@ -12,8 +12,8 @@ from app.schemas.user import (
     TokenResponse,
 )
 from app.utils.auth import (
-    hash_password,
-    verify_password,
+    ahash_password,
+    averify_password,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -46,7 +46,7 @@ async def register(user_data: UserRegister):
     user = User(
         email=user_data.email,
         name=user_data.name,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await ahash_password(user_data.password),
     )
     await user.insert()
     
@@ -67,7 +67,7 @@ async def login(credentials: UserLogin):
     # Find user
     user = await User.find_one(User.email == credentials.email)
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    if not user or not await averify_password(credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
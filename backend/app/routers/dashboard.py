@@ -3,38 +3,73 @@ Dashboard endpoint.
 Provides overview statistics and trend data.
 """
 
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
+import orjson
+from fastapi import APIRouter, Depends, Response
+from datetime import datetime
+from beanie import PydanticObjectId
 
 from app.models.user import User
 from app.utils.auth import get_current_user
 from app.services.analytics import (
+    CARBON_TOTAL_GROUP,
+    CATEGORY_GROUP,
     aggregate_transactions,
-    get_carbon_total,
-    get_category_breakdown,
+    bucket_totals,
+    carbon_buckets,
+    date_range,
+    first_total,
+    month_edges,
+    month_labels,
+    summarize_categories,
+    to_object_id,
 )
+from app.utils.cache import cached_per_user
 from app.constants import DEFAULT_MONTHLY_GOAL
 
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
 
-@router.get("")
-async def get_dashboard(current_user: User = Depends(get_current_user)):
-    """Get dashboard statistics for the current user."""
+@cached_per_user(maxsize=1024, ttl=60)
+async def build_dashboard(user_id: PydanticObjectId) -> bytes:
+    """
+    Build the JSON-encoded dashboard payload for a user.
+    Cached briefly; transaction writes invalidate it.
+    """
     now = datetime.utcnow()
-    user_id = current_user.id
     
     # Time boundaries
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    last_month_start, month_start = month_edges(now.year, now.month, 2)[:2]
+    
+    # 12-month trend: start of each month, plus the start of next month
+    trend_edges = list(month_edges(now.year, now.month))
+    
+    # Every dashboard metric in one round-trip over the user's transactions
+    pipeline = [
+        {"$match": {"user_id": to_object_id(user_id)}},
+        {"$project": {"_id": 0, "date": 1, "category": 1, "carbon": 1, "amount": 1}},
+        {"$facet": {
+            "all_time": [CARBON_TOTAL_GROUP],
+            "current_month": [
+                {"$match": {"date": date_range(month_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "last_month": [
+                {"$match": {"date": date_range(last_month_start, month_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "categories": [CATEGORY_GROUP],
+            "trend": carbon_buckets(trend_edges),
+        }},
+    ]
+    facets = (await aggregate_transactions(pipeline))[0]
     
     # All-time total for headline stat
-    all_time_carbon = await get_carbon_total(user_id)
+    all_time_carbon = first_total(facets["all_time"])
     
     # Current and last month carbon for comparison
-    current_month_carbon = await get_carbon_total(user_id, start_date=month_start)
-    last_month_carbon = await get_carbon_total(user_id, start_date=last_month_start, end_date=month_start)
+    current_month_carbon = first_total(facets["current_month"])
+    last_month_carbon = first_total(facets["last_month"])
     
     # Calculate monthly change
     monthly_change = 0
@@ -42,8 +77,7 @@ async def get_dashboard(current_user: User = Depends(get_current_user)):
         monthly_change = round(((current_month_carbon - last_month_carbon) / last_month_carbon) * 100, 1)
     
     # Category breakdown for ALL transactions (not just this month)
-    categories = await get_category_breakdown(user_id)
-    categories.sort(key=lambda x: x["percentage"], reverse=True)
+    categories = summarize_categories(facets["categories"])
     
     # Highest impact category
     highest_impact = {"category": "None", "percentage": 0}
@@ -53,19 +87,17 @@ async def get_dashboard(current_user: User = Depends(get_current_user)):
             "percentage": categories[0]["percentage"],
         }
     
-    # 12-month trend data
-    trend_data = []
-    for i in range(11, -1, -1):
-        m_start = (now.replace(day=1) - timedelta(days=i * 30)).replace(day=1)
-        m_end = (m_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-        
-        carbon = await get_carbon_total(user_id, start_date=m_start, end_date=m_end)
-        trend_data.append({
-            "month": m_start.strftime("%b"),
-            "value": round(carbon, 1),
-        })
+    # 12-month trend data (months with no transactions have no bucket)
+    trend_totals = bucket_totals(facets["trend"], trend_edges)
+    trend_data = [
+        {
+            "month": label,
+            "value": round(total, 1),
+        }
+        for total, label in zip(trend_totals, month_labels(now.year, now.month))
+    ]
     
-    return {
+    payload = {
         "stats": {
             "totalCarbon": round(current_month_carbon, 1),
             "allTimeCarbon": round(all_time_carbon, 1),
@@ -87,3 +119,10 @@ async def get_dashboard(current_user: User = Depends(get_current_user)):
         ],
         "trendData": trend_data,
     }
+    return orjson.dumps(payload)
+
+
+@router.get("")
+async def get_dashboard(current_user: User = Depends(get_current_user)):
+    """Get dashboard statistics for the current user."""
+    return Response(content=await build_dashboard(current_user.id), media_type="application/json")
@@ -3,7 +3,8 @@ Insights and recommendations endpoint.
 Generates personalized tips based on spending patterns.
 """
 
-from fastapi import APIRouter, Depends, Query
+import orjson
+from fastapi import APIRouter, Depends, Query, Response
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -89,50 +90,83 @@ RECOMMENDATIONS = {
 }
 
 
-def generate_recommendations(categories: list[dict]) -> list[dict]:
-    """Generate recommendations based on category breakdown."""
-    recommendations = []
+# Fallback tip when there is too little data for personalized ones
+GENERAL_RECOMMENDATION = {
+    "id": "general-track",
+    "category": "General",
+    "title": "Keep Tracking",
+    "tip": "Add more transactions to get personalized insights based on your spending patterns.",
+    "priority": "low",
+    "potential_savings": "Better insights",
+    "current_carbon": 0,
+    "percentage": 0,
+}
+
+PERIOD_LABELS = {
+    "week": "this week",
+    "month": "this month",
+    "year": "this year",
+}
+
+# (id, title, tip, savings_percent) per category and priority, resolved once.
+# "high" falls back to the "medium" template for categories without one.
+RECOMMENDATION_TEMPLATES = {
+    category: {
+        priority: (f"{category.lower()}-{priority}", rec["title"], rec["tip"], rec["savings_percent"])
+        for priority, rec in (
+            ("high", templates.get("high") or templates.get("medium")),
+            ("medium", templates.get("medium")),
+        )
+        if rec
+    }
+    for category, templates in RECOMMENDATIONS.items()
+}
+
+
+def generate_recommendations(categories: list[dict]) -> tuple[list[dict], list[float]]:
+    """
+    Generate recommendations based on category breakdown, high priority first,
+    along with each one's potential savings in kg CO₂.
+    """
+    highs, mediums = [], []
     total_carbon = sum(c["carbon"] for c in categories) or 1
     
     for cat in categories:
-        category = cat["category"]
+        templates = RECOMMENDATION_TEMPLATES.get(cat["category"])
+        if templates is None:
+            continue
+        
         carbon = cat["carbon"]
         percentage = (carbon / total_carbon) * 100
         
-        if category not in RECOMMENDATIONS:
-            continue
-        
         # Determine priority based on percentage
         if percentage > 35:
-            priority = "high"
-            rec_data = RECOMMENDATIONS[category].get("high") or RECOMMENDATIONS[category].get("medium")
+            priority, bucket = "high", highs
         elif percentage > 15 or carbon > 10:
-            priority = "medium"
-            rec_data = RECOMMENDATIONS[category].get("medium")
+            priority, bucket = "medium", mediums
         else:
             continue
         
-        if not rec_data:
+        template = templates.get(priority)
+        if template is None:
             continue
         
-        potential_savings = round(carbon * rec_data["savings_percent"], 1)
+        rec_id, title, tip, savings_percent = template
+        potential_savings = round(carbon * savings_percent, 1)
         
-        recommendations.append({
-            "id": f"{category.lower()}-{priority}",
-            "category": category,
-            "title": rec_data["title"],
-            "tip": rec_data["tip"],
+        bucket.append((potential_savings, {
+            "id": rec_id,
+            "category": cat["category"],
+            "title": title,
+            "tip": tip,
             "priority": priority,
             "potential_savings": f"{potential_savings} kg CO₂/month",
             "current_carbon": round(carbon, 1),
             "percentage": round(percentage, 1),
-        })
-    
-    # Sort by priority (high first)
-    priority_order = {"high": 0, "medium": 1, "low": 2}
-    recommendations.sort(key=lambda x: priority_order.get(x["priority"], 2))
+        }))
     
-    return recommendations
+    ranked = highs + mediums
+    return [rec for _, rec in ranked], [savings for savings, _ in ranked]
 
 
 @router.get("")
@@ -145,49 +179,34 @@ async def get_insights(
     
     # Calculate date range based on period
     start_date = None
-    period_label = "all time"
+    period_label = PERIOD_LABELS.get(period, "all time")
     
     if period == "week":
-        start_date = now - timedelta(days=7)
-        period_label = "this week"
+        # Whole minutes, so repeat requests share a cached breakdown
+        start_date = (now - timedelta(days=7)).replace(second=0, microsecond=0)
     elif period == "month":
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        period_label = "this month"
+        start_date = datetime(now.year, now.month, 1)
     elif period == "year":
-        start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        period_label = "this year"
+        start_date = datetime(now.year, 1, 1)
     
     # Get category breakdown for the selected period
     categories = await get_category_breakdown(current_user.id, start_date=start_date)
     
     # Generate recommendations
-    recommendations = generate_recommendations(categories)
+    recommendations, savings_kg = generate_recommendations(categories)
     
     # Calculate total potential savings
-    total_potential = sum(
-        float(r["potential_savings"].split()[0])
-        for r in recommendations
-        if r["potential_savings"]
-    )
+    total_potential = sum(savings_kg)
     
     # Add a general tip if we don't have many recommendations
     if len(recommendations) < 2:
-        recommendations.append({
-            "id": "general-track",
-            "category": "General",
-            "title": "Keep Tracking",
-            "tip": "Add more transactions to get personalized insights based on your spending patterns.",
-            "priority": "low",
-            "potential_savings": "Better insights",
-            "current_carbon": 0,
-            "percentage": 0,
-        })
+        recommendations.append(GENERAL_RECOMMENDATION)
     
     # Generate primary insight message (friendly, encouraging tone)
     primary_insight = None
     if recommendations and recommendations[0]["category"] != "General":
         top = recommendations[0]
-        savings = top["potential_savings"].split()[0] if top["potential_savings"] else "some"
+        savings = savings_kg[0]
         primary_insight = {
             "category": top["category"],
             "message": f"{top['category']} is your biggest impact {period_label}. {top['tip']}",
@@ -195,7 +214,7 @@ async def get_insights(
             "encouragement": "Small changes add up! 🌱"
         }
     
-    return {
+    payload = {
         "period": period or "all",
         "period_label": period_label,
         "recommendations": recommendations[:5],
@@ -204,3 +223,4 @@ async def get_insights(
         "potential_monthly_savings": round(total_potential, 1),
         "category_breakdown": categories,
     }
+    return Response(content=orjson.dumps(payload), media_type="application/json")
@@ -3,20 +3,17 @@ Progress and gamification endpoint.
 Simplified for core functionality: level, streak, and emission trends.
 """
 
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
+import orjson
+from bisect import bisect_right
+from fastapi import APIRouter, Depends, Response
+from datetime import datetime
+from beanie import PydanticObjectId
 
 from app.models.user import User
-from app.models.transaction import Transaction
 from app.utils.auth import get_current_user
-from app.services.analytics import (
-    aggregate_transactions,
-    get_carbon_total,
-    get_category_breakdown,
-    get_tracking_streak,
-    get_import_count,
-)
-from app.constants import DEFAULT_WEEKLY_GOAL, DEFAULT_MONTHLY_GOAL, XP_THRESHOLDS
+from app.services.analytics import get_progress_bundle
+from app.utils.cache import cached_per_user
+from app.constants import DEFAULT_WEEKLY_GOAL, DEFAULT_MONTHLY_GOAL, xp_to_level
 
 
 router = APIRouter(prefix="/progress", tags=["Progress"])
@@ -45,6 +42,7 @@ REWARDS = [
     {"at_xp": 750, "name": "Carbon Crusher Badge", "icon": "💪"},
     {"at_xp": 1000, "name": "Planet Hero Badge", "icon": "🏆"},
 ]
+REWARD_XP = tuple(r["at_xp"] for r in REWARDS)
 
 
 def calculate_level(total_transactions: int, days_tracked: int, import_count: int) -> tuple[int, int, str]:
@@ -55,11 +53,7 @@ def calculate_level(total_transactions: int, days_tracked: int, import_count: in
     # - 2 XP bonus per imported transaction (encourages bulk uploads)
     xp = (total_transactions * 10) + (days_tracked * 5) + (import_count * 2)
     
-    level = 1
-    for i, threshold in enumerate(XP_THRESHOLDS):
-        if xp >= threshold:
-            level = i + 1
-    
+    level = xp_to_level(xp)
     title = LEVEL_TITLES[min(level - 1, len(LEVEL_TITLES) - 1)]
     
     return level, xp, title
@@ -67,39 +61,38 @@ def calculate_level(total_transactions: int, days_tracked: int, import_count: in
 
 def get_next_reward(xp: int) -> dict | None:
     """Get the next reward the user is working towards."""
-    for reward in REWARDS:
-        if xp < reward["at_xp"]:
-            return {
-                "name": reward["name"],
-                "icon": reward["icon"],
-                "xp_needed": reward["at_xp"] - xp,
-                "xp_target": reward["at_xp"],
-            }
-    return None
+    i = bisect_right(REWARD_XP, xp)
+    if i == len(REWARDS):
+        return None
+    
+    reward = REWARDS[i]
+    return {
+        "name": reward["name"],
+        "icon": reward["icon"],
+        "xp_needed": reward["at_xp"] - xp,
+        "xp_target": reward["at_xp"],
+    }
 
 
-@router.get("")
-async def get_progress(current_user: User = Depends(get_current_user)):
-    """Get user's progress: level, streak, and emission trends."""
+@cached_per_user(maxsize=1024, ttl=60)
+async def build_progress(user_id: PydanticObjectId) -> bytes:
+    """
+    Build the JSON-encoded progress payload for a user.
+    Cached briefly; transaction writes invalidate it.
+    """
     now = datetime.utcnow()
-    user_id = current_user.id
-    
-    # Time boundaries
-    week_start = now - timedelta(days=now.weekday())
-    last_week_start = week_start - timedelta(days=7)
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_month_start = (month_start - timedelta(days=1)).replace(day=1)
-    
-    # Get carbon totals
-    week_carbon = await get_carbon_total(user_id, start_date=week_start)
-    last_week_carbon = await get_carbon_total(user_id, start_date=last_week_start, end_date=week_start)
-    month_carbon = await get_carbon_total(user_id, start_date=month_start)
-    last_month_carbon = await get_carbon_total(user_id, start_date=last_month_start, end_date=month_start)
     
-    # Transaction count and tracking stats
-    total_transactions = await Transaction.find(Transaction.user_id == user_id).count()
-    days_tracked = await get_tracking_streak(user_id)  # Now returns unique days with transactions
-    import_count = await get_import_count(user_id)
+    # Every progress metric in one round-trip
+    bundle = await get_progress_bundle(user_id, now)
+    week_carbon = bundle["week_carbon"]
+    last_week_carbon = bundle["last_week_carbon"]
+    month_carbon = bundle["month_carbon"]
+    last_month_carbon = bundle["last_month_carbon"]
+    total_transactions = bundle["total_transactions"]
+    days_tracked = bundle["days_tracked"]  # Unique days with transactions
+    import_count = bundle["import_count"]
+    categories = bundle["categories"]  # All-time category breakdown
+    history = bundle["history"]  # Last 12 weeks for chart
     
     # Calculate level and title (with import bonus)
     level, xp, title = calculate_level(total_transactions, days_tracked, import_count)
@@ -133,21 +126,14 @@ async def get_progress(current_user: User = Depends(get_current_user)):
         },
     ]
     
-    # All-time category breakdown
-    categories = await get_category_breakdown(user_id)
-    
-    # Carbon history (last 12 weeks for chart)
-    carbon_history = []
-    for i in range(12):
-        w_end = now - timedelta(weeks=i)
-        w_start = w_end - timedelta(days=7)
-        carbon = await get_carbon_total(user_id, start_date=w_start, end_date=w_end)
-        carbon_history.append({
-            "week": f"W{12-i}",
-            "date": w_start.strftime("%b %d"),
-            "carbon": round(carbon, 1),
-        })
-    carbon_history.reverse()
+    carbon_history = [
+        {
+            "week": f"W{i}",
+            "date": week["start"].strftime("%b %d"),
+            "carbon": round(week["carbon"], 1),
+        }
+        for i, week in enumerate(history, start=1)
+    ]
     
     # Motivational message based on progress
     motivation = "You're making a difference! 🌍"
@@ -160,7 +146,7 @@ async def get_progress(current_user: User = Depends(get_current_user)):
     elif total_transactions < 5:
         motivation = "Welcome! Upload more to see your impact 🌱"
     
-    return {
+    payload = {
         "gamification": {
             "level": level,
             "title": title,
@@ -180,3 +166,10 @@ async def get_progress(current_user: User = Depends(get_current_user)):
             "on_track": month_carbon <= DEFAULT_MONTHLY_GOAL,
         },
     }
+    return orjson.dumps(payload)
+
+
+@router.get("")
+async def get_progress(current_user: User = Depends(get_current_user)):
+    """Get user's progress: level, streak, and emission trends."""
+    return Response(content=await build_progress(current_user.id), media_type="application/json")
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, UploadFile, File
 from beanie import PydanticObjectId
 from typing import Optional
 from datetime import datetime
+from bson import ObjectId
+import re
 import pandas as pd
 import io
 
@@ -15,11 +17,22 @@ from app.schemas.transaction import (
     ImportResponse,
 )
 from app.utils.auth import get_current_user
-from app.services.carbon import calculate_carbon, categorize_transaction, clean_transaction_name
+from app.utils.cache import invalidate_user_cache
+from app.services.analytics import aggregate_transactions, to_object_id
+from app.services.carbon import (
+    calculate_carbon,
+    calculate_carbon_batch,
+    categorize_transactions,
+    clean_transaction_name,
+)
+from app.constants import CATEGORIES
 
 
 router = APIRouter(prefix="/transactions", tags=["Transactions"])
 
+# Known header patterns, used to find the header row in bank statements
+HEADER_PATTERN = re.compile("date|transaction|narration|description|amount|debit|credit|withdrawal")
+
 
 @router.get("", response_model=TransactionsListResponse)
 async def get_transactions(
@@ -47,31 +60,34 @@ async def get_transactions(
     if search:
         query["name"] = {"$regex": search, "$options": "i"}
     
-    # Get total count
-    total = await Transaction.find(query).count()
-    
-    # Get total emissions and amount using Motor collection directly
-    collection = Transaction.get_pymongo_collection()
+    # Requested page plus total count, emissions and amount in one round-trip.
+    # Sorting before $facet lets the sort use the (user_id, date) indexes.
     pipeline = [
         {"$match": query},
-        {"$group": {"_id": None, "total_carbon": {"$sum": "$carbon"}, "total_amount": {"$sum": "$amount"}}}
+        {"$sort": {"date": -1}},
+        {"$facet": {
+            "items": [
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+            ],
+            "totals": [
+                {"$group": {"_id": None, "count": {"$sum": 1}, "total_carbon": {"$sum": "$carbon"}, "total_amount": {"$sum": "$amount"}}},
+            ],
+        }},
     ]
-    cursor = collection.aggregate(pipeline)
-    agg_result = await cursor.to_list(length=None)
-    total_emissions = agg_result[0]["total_carbon"] if agg_result else 0
-    total_amount = agg_result[0]["total_amount"] if agg_result else 0
+    facets = (await aggregate_transactions(pipeline))[0]
+    totals = facets["totals"][0] if facets["totals"] else {"count": 0, "total_carbon": 0, "total_amount": 0}
     
-    # Get paginated transactions
-    transactions = await Transaction.find(query).sort(-Transaction.date).skip((page - 1) * page_size).limit(page_size).to_list()
-    
-    return TransactionsListResponse(
-        transactions=[TransactionResponse.from_transaction(t) for t in transactions],
-        total=total,
+    # Serialize directly; response_model is kept for the OpenAPI schema only
+    response = TransactionsListResponse.model_construct(
+        transactions=[TransactionResponse.from_document(doc) for doc in facets["items"]],
+        total=totals["count"],
         page=page,
         page_size=page_size,
-        total_emissions=round(total_emissions, 2),
-        total_amount=round(total_amount, 2),
+        total_emissions=round(totals["total_carbon"], 2),
+        total_amount=round(totals["total_amount"], 2),
     )
+    return Response(content=response.model_dump_json(), media_type="application/json")
 
 
 @router.post("", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
@@ -97,6 +113,7 @@ async def create_transaction(
     )
     
     await transaction.insert()
+    invalidate_user_cache(current_user.id)
     
     return TransactionResponse.from_transaction(transaction)
 
@@ -159,6 +176,7 @@ async def update_transaction(
     
     transaction.updated_at = datetime.utcnow()
     await transaction.save()
+    invalidate_user_cache(current_user.id)
     
     return TransactionResponse.from_transaction(transaction)
 
@@ -184,6 +202,219 @@ async def delete_transaction(
         )
     
     await transaction.delete()
+    invalidate_user_cache(current_user.id)
+
+
+def find_header_row(df_raw: pd.DataFrame) -> int:
+    """Index of the first of the leading 50 rows that looks like column headers."""
+    for idx, row in df_raw.head(50).iterrows():
+        row_str = " ".join(str(v).lower() for v in row.values if pd.notna(v))
+        # Found at least 2 header patterns
+        if len(set(HEADER_PATTERN.findall(row_str))) >= 2:
+            return idx
+    return 0
+
+
+def apply_header_row(df_raw: pd.DataFrame, header_row: int) -> pd.DataFrame:
+    """
+    Use one row of a headerless frame as its column names, dropping it and
+    the rows above. Names follow pandas' own header handling: blank cells
+    become "Unnamed: i" and repeats get ".1", ".2", ... suffixes.
+    """
+    columns, seen = [], {}
+    for i, value in enumerate(df_raw.iloc[header_row]):
+        name = f"Unnamed: {i}" if pd.isna(value) else str(value)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns.append(f"{name}.{count}" if count else name)
+    
+    df = df_raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = columns
+    return df
+
+
+# Date formats tried in order for text dates (including Indian DD/MM/YYYY)
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%d/%m/%y"]
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Parse a date column to datetimes, NaT where a value can't be parsed."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    
+    dates = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    
+    is_datetime = values.map(lambda v: isinstance(v, datetime)).astype(bool)
+    if is_datetime.any():
+        dates[is_datetime] = pd.to_datetime(values[is_datetime])
+    
+    # Try each format on the text dates that no earlier format matched.
+    # A column with no text cells (e.g. all blank) is float, so the .str
+    # accessor can't be used; those rows just stay NaT and are skipped.
+    is_text = values.map(lambda v: isinstance(v, str)).astype(bool)
+    remaining = values[is_text].map(str.strip)
+    for fmt in DATE_FORMATS:
+        if remaining.empty:
+            break
+        parsed = pd.to_datetime(remaining, format=fmt, errors="coerce")
+        matched = parsed.notna()
+        dates[matched.index[matched]] = parsed[matched]
+        remaining = remaining[~matched]
+    
+    return dates
+
+
+def parse_amounts(values: pd.Series, strip: str) -> tuple[pd.Series, pd.Series]:
+    """
+    Parse an amount column to floats, ignoring `strip` characters.
+    Returns (amounts, invalid): missing or blank cells are 0, and invalid
+    marks cells that aren't numbers.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float).fillna(0.0), pd.Series(False, index=values.index)
+    
+    text = values.map(str).str.replace(f"[{re.escape(strip)}]", "", regex=True).str.strip()
+    amounts = pd.to_numeric(text, errors="coerce")
+    missing = values.isna() | (text == "")
+    return amounts.where(~missing, 0.0).astype(float), amounts.isna() & ~missing
+
+
+# Rows parsed and inserted per batch for CSV imports
+IMPORT_CHUNK_SIZE = 5_000
+
+
+def find_import_columns(columns: pd.Index) -> dict:
+    """
+    Match normalized statement columns to the fields we import.
+    Raises a 400 when date, name, or an amount column is missing.
+    """
+    # Map columns - expanded to support Indian bank formats
+    date_columns = ["date", "transaction_date", "trans_date", "posted_date", "posting_date", "value_dt", "txn_date"]
+    name_columns = ["description", "name", "merchant", "payee", "memo", "transaction_description", "narration", "particulars", "remarks"]
+    amount_columns = ["amount", "debit", "credit", "transaction_amount", "value"]
+    withdrawal_columns = ["withdrawal_amt", "withdrawal", "debit_amt", "debit", "dr_amount", "dr"]
+    deposit_columns = ["deposit_amt", "deposit", "credit_amt", "credit", "cr_amount", "cr"]
+    category_columns = ["category", "type", "transaction_type"]
+    
+    # Find matching columns
+    date_col = next((c for c in date_columns if c in columns), None)
+    name_col = next((c for c in name_columns if c in columns), None)
+    amount_col = next((c for c in amount_columns if c in columns), None)
+    withdrawal_col = next((c for c in withdrawal_columns if c in columns), None)
+    deposit_col = next((c for c in deposit_columns if c in columns), None)
+    category_col = next((c for c in category_columns if c in columns), None)
+    
+    # If we have withdrawal/deposit columns but no single amount column, we'll use them
+    has_separate_amounts = withdrawal_col or deposit_col
+    
+    if not date_col or not name_col or (not amount_col and not has_separate_amounts):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not find required columns. Found: {list(columns)}. Need: date, description/name, amount",
+        )
+    
+    return {
+        "date": date_col,
+        "name": name_col,
+        "amount": amount_col,
+        "withdrawal": withdrawal_col,
+        "deposit": deposit_col,
+        "category": category_col,
+    }
+
+
+def build_import_documents(
+    df: pd.DataFrame,
+    columns: dict,
+    user_id: ObjectId,
+    now: datetime,
+) -> list[dict]:
+    """Parse one frame of a statement into raw Transaction documents."""
+    date_col = columns["date"]
+    name_col = columns["name"]
+    amount_col = columns["amount"]
+    withdrawal_col = columns["withdrawal"]
+    deposit_col = columns["deposit"]
+    category_col = columns["category"]
+    has_separate_amounts = withdrawal_col or deposit_col
+    
+    # Parse whole columns at once; rows failing any check are skipped
+    dates = parse_dates(df[date_col])
+    names = df[name_col].map(str).str.strip()
+    keep = dates.notna() & (names != "") & (names.str.lower() != "nan")
+    
+    # Amount: single amount column, falling back to separate
+    # withdrawal/deposit columns (like HDFC format) where it is empty
+    has_amount = df[amount_col].notna() if amount_col else pd.Series(False, index=df.index)
+    amounts = pd.Series(0.0, index=df.index)
+    invalid = ~has_amount
+    
+    if amount_col:
+        single, single_invalid = parse_amounts(df[amount_col], "$,₹")
+        amounts = amounts.mask(has_amount, single)
+        invalid = invalid.mask(has_amount, single_invalid)
+    
+    if has_separate_amounts:
+        zeros = (pd.Series(0.0, index=df.index), pd.Series(False, index=df.index))
+        withdrawal, withdrawal_invalid = parse_amounts(df[withdrawal_col], ",₹") if withdrawal_col else zeros
+        deposit, deposit_invalid = parse_amounts(df[deposit_col], ",₹") if deposit_col else zeros
+        
+        # Use withdrawal (expense) for carbon calculation, or deposit if no withdrawal
+        separate = withdrawal.where(withdrawal > 0, deposit)
+        amounts = amounts.where(has_amount, separate)
+        invalid = invalid.where(has_amount, withdrawal_invalid | deposit_invalid)
+    
+    amounts = amounts.abs()
+    keep &= ~invalid & (amounts > 0)
+    
+    # Category: use the file's category when it is one of ours, otherwise
+    # categorize by name (once per distinct name, ML misses in one batch)
+    if category_col:
+        given = df[category_col].map(str).str.strip().where(df[category_col].notna())
+        has_category = given.isin(CATEGORIES)
+    else:
+        given = pd.Series(None, index=df.index, dtype=object)
+        has_category = pd.Series(False, index=df.index)
+    
+    to_categorize = names[keep & ~has_category].unique().tolist()
+    categorized = dict(zip(to_categorize, categorize_transactions(to_categorize)))
+    categories = given.where(has_category, names.map(categorized))
+    
+    # Skip transactions that don't match any category (e.g., P2P transfers)
+    keep &= categories.notna()
+    
+    # Clean up transaction names for readability
+    cleaned = {name: clean_transaction_name(name) for name in names[keep].unique()}
+    
+    kept_names = names[keep].tolist()
+    kept_categories = categories[keep].tolist()
+    emissions = calculate_carbon_batch(amounts[keep].to_numpy(), kept_categories, kept_names)  # Use original names for matching
+    
+    # Build raw documents directly; every field is already parsed and
+    # checked above, so per-row model validation is unnecessary
+    documents = []
+    
+    for date_value, name, amount, category, carbon in zip(
+        dates[keep].tolist(),
+        kept_names,
+        amounts[keep].tolist(),
+        kept_categories,
+        emissions,
+    ):
+        documents.append({
+            "user_id": user_id,
+            "name": cleaned[name][:255],  # Use cleaned name
+            "description": None,
+            "category": category,
+            "date": date_value.to_pydatetime(),
+            "amount": amount,
+            "carbon": carbon,
+            "source": "import",
+            "created_at": now,
+            "updated_at": now,
+        })
+    
+    return documents
 
 
 @router.post("/import", response_model=ImportResponse)
@@ -214,185 +445,52 @@ async def import_transactions(
         
         # Parse file - first try to auto-detect header row
         # Many bank statements have header info in the first few rows
-        header_row = 0
-        
-        # Known header patterns to look for
-        header_patterns = ["date", "transaction", "narration", "description", "amount", "debit", "credit", "withdrawal"]
-        
         if filename.endswith(".csv"):
-            # First, read without header to find the actual header row
+            # Sniff the header from the first rows only, then parse the
+            # rest in bounded chunks so only one chunk's DataFrame is in memory
             df_raw = pd.read_csv(io.BytesIO(content), header=None, nrows=50)
-            
-            for idx, row in df_raw.iterrows():
-                row_str = " ".join(str(v).lower() for v in row.values if pd.notna(v))
-                # Check if this row contains column headers
-                matches = sum(1 for pattern in header_patterns if pattern in row_str)
-                if matches >= 2:  # Found at least 2 header patterns
-                    header_row = idx
-                    break
-            
-            # Re-read with correct header
-            df = pd.read_csv(io.BytesIO(content), header=header_row)
+            frames = pd.read_csv(
+                io.BytesIO(content),
+                header=find_header_row(df_raw),
+                chunksize=IMPORT_CHUNK_SIZE,
+            )
         else:
-            # Same logic for Excel files
-            df_raw = pd.read_excel(io.BytesIO(content), header=None, nrows=50)
-            
-            for idx, row in df_raw.iterrows():
-                row_str = " ".join(str(v).lower() for v in row.values if pd.notna(v))
-                matches = sum(1 for pattern in header_patterns if pattern in row_str)
-                if matches >= 2:
-                    header_row = idx
-                    break
-            
-            df = pd.read_excel(io.BytesIO(content), header=header_row)
-        
-        # Normalize column names
-        df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_").str.replace(".", "")
-        
-        # Map columns - expanded to support Indian bank formats
-        date_columns = ["date", "transaction_date", "trans_date", "posted_date", "posting_date", "value_dt", "txn_date"]
-        name_columns = ["description", "name", "merchant", "payee", "memo", "transaction_description", "narration", "particulars", "remarks"]
-        amount_columns = ["amount", "debit", "credit", "transaction_amount", "value"]
-        withdrawal_columns = ["withdrawal_amt", "withdrawal", "debit_amt", "debit", "dr_amount", "dr"]
-        deposit_columns = ["deposit_amt", "deposit", "credit_amt", "credit", "cr_amount", "cr"]
-        category_columns = ["category", "type", "transaction_type"]
-        
-        # Find matching columns
-        date_col = next((c for c in date_columns if c in df.columns), None)
-        name_col = next((c for c in name_columns if c in df.columns), None)
-        amount_col = next((c for c in amount_columns if c in df.columns), None)
-        withdrawal_col = next((c for c in withdrawal_columns if c in df.columns), None)
-        deposit_col = next((c for c in deposit_columns if c in df.columns), None)
-        category_col = next((c for c in category_columns if c in df.columns), None)
+            # Excel has to load the whole workbook even for a few rows,
+            # so read it once and split off the header in memory
+            df_raw = pd.read_excel(io.BytesIO(content), header=None)
+            frames = [apply_header_row(df_raw, find_header_row(df_raw))]
         
-        # If we have withdrawal/deposit columns but no single amount column, we'll use them
-        has_separate_amounts = withdrawal_col or deposit_col
+        user_id = to_object_id(current_user.id)
+        now = datetime.utcnow()
+        columns = None
+        row_count = 0
+        documents = []
         
-        if not date_col or not name_col or (not amount_col and not has_separate_amounts):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Could not find required columns. Found: {list(df.columns)}. Need: date, description/name, amount",
-            )
+        # Parse every chunk before inserting anything, so a file that fails
+        # partway through leaves no transactions behind
+        for df in frames:
+            # Normalize column names
+            df.columns = df.columns.str.lower().str.strip().str.replace(" ", "_").str.replace(".", "")
+            if columns is None:
+                columns = find_import_columns(df.columns)
+            
+            # Column dtypes are inferred per chunk: a chunk of only blank
+            # separator rows (common at the end of bank exports) has all-float
+            # columns, which the parse_* helpers must treat as skippable rows
+            documents.extend(build_import_documents(df, columns, user_id, now))
+            row_count += len(df)
         
-        imported_count = 0
-        skipped_count = 0
+        imported_count = len(documents)
         total_carbon = 0
-        transactions_to_insert = []
-        
-        for _, row in df.iterrows():
-            try:
-                # Parse date
-                date_value = row[date_col]
-                if pd.isna(date_value):
-                    skipped_count += 1
-                    continue
-                
-                if isinstance(date_value, str):
-                    # Try multiple date formats (including Indian format DD/MM/YYYY)
-                    for fmt in ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%d/%m/%y"]:
-                        try:
-                            date_value = datetime.strptime(date_value.strip(), fmt)
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        skipped_count += 1
-                        continue
-                elif hasattr(date_value, "to_pydatetime"):
-                    date_value = date_value.to_pydatetime()
-                
-                # Parse name
-                name = str(row[name_col]).strip()
-                if not name or name.lower() == "nan":
-                    skipped_count += 1
-                    continue
-                
-                # Parse amount - handle single amount column OR separate withdrawal/deposit columns
-                amount = 0
-                
-                if amount_col and not pd.isna(row.get(amount_col)):
-                    # Single amount column
-                    amount = row[amount_col]
-                elif has_separate_amounts:
-                    # Separate withdrawal/deposit columns (like HDFC format)
-                    withdrawal = 0
-                    deposit = 0
-                    
-                    if withdrawal_col and not pd.isna(row.get(withdrawal_col)):
-                        w_val = row[withdrawal_col]
-                        if isinstance(w_val, str):
-                            w_val = w_val.replace(",", "").replace("₹", "").strip()
-                            if w_val:
-                                withdrawal = float(w_val)
-                        else:
-                            withdrawal = float(w_val) if w_val else 0
-                    
-                    if deposit_col and not pd.isna(row.get(deposit_col)):
-                        d_val = row[deposit_col]
-                        if isinstance(d_val, str):
-                            d_val = d_val.replace(",", "").replace("₹", "").strip()
-                            if d_val:
-                                deposit = float(d_val)
-                        else:
-                            deposit = float(d_val) if d_val else 0
-                    
-                    # Use withdrawal (expense) for carbon calculation, or deposit if no withdrawal
-                    amount = withdrawal if withdrawal > 0 else deposit
-                else:
-                    skipped_count += 1
-                    continue
-                
-                # Handle string amounts
-                if isinstance(amount, str):
-                    amount = float(amount.replace("$", "").replace(",", "").replace("₹", "").strip())
-                amount = abs(float(amount)) if amount else 0
-                
-                if amount <= 0:
-                    skipped_count += 1
-                    continue
-                
-                # Determine category
-                if category_col and not pd.isna(row[category_col]):
-                    category = str(row[category_col]).strip()
-                    # Normalize to our categories
-                    if category not in ["Travel", "Food", "Shopping", "Electricity", "Gas", "Water", "Home"]:
-                        category = categorize_transaction(name)
-                else:
-                    category = categorize_transaction(name)
-                
-                # Skip transactions that don't match any category (e.g., P2P transfers)
-                if category is None:
-                    skipped_count += 1
-                    continue
-                
-                # Clean up the transaction name for readability
-                clean_name = clean_transaction_name(name)
-                
-                # Calculate carbon
-                carbon = calculate_carbon(amount, category, name)  # Use original name for matching
-                
-                # Create transaction
-                transaction = Transaction(
-                    user_id=current_user.id,
-                    name=clean_name[:255],  # Use cleaned name
-                    category=category,
-                    date=date_value,
-                    amount=amount,
-                    carbon=carbon,
-                    source="import",
-                )
-                
-                transactions_to_insert.append(transaction)
-                imported_count += 1
-                total_carbon += carbon
-                
-            except Exception:
-                skipped_count += 1
-                continue
+        for document in documents:
+            total_carbon += document["carbon"]
         
         # Bulk insert
-        if transactions_to_insert:
-            await Transaction.insert_many(transactions_to_insert)
+        if documents:
+            await Transaction.get_pymongo_collection().insert_many(documents, ordered=False)
+            invalidate_user_cache(current_user.id)
+        
+        skipped_count = row_count - imported_count
         
         return ImportResponse(
             success=True,
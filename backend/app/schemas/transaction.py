@@ -43,7 +43,8 @@ class TransactionResponse(BaseModel):
         
     @classmethod
     def from_transaction(cls, tx):
-        return cls(
+        # Fields come from an already-validated Transaction, so skip revalidation
+        return cls.model_construct(
             id=str(tx.id),
             user_id=str(tx.user_id),
             name=tx.name,
@@ -56,6 +57,23 @@ class TransactionResponse(BaseModel):
             created_at=tx.created_at,
             updated_at=tx.updated_at,
         )
+    
+    @classmethod
+    def from_document(cls, doc: dict):
+        # Raw transactions collection document (e.g. from an aggregation)
+        return cls.model_construct(
+            id=str(doc["_id"]),
+            user_id=str(doc["user_id"]),
+            name=doc["name"],
+            category=doc["category"],
+            date=doc["date"],
+            amount=doc["amount"],
+            carbon=doc["carbon"],
+            description=doc.get("description"),
+            source=doc.get("source", "manual"),
+            created_at=doc["created_at"],
+            updated_at=doc["updated_at"],
+        )
 
 
 class TransactionsListResponse(BaseModel):
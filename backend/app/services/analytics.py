@@ -2,12 +2,16 @@
 Shared database utilities for aggregation queries.
 """
 
+from array import array
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any
 from beanie import PydanticObjectId
 from bson import ObjectId
 
+from app.constants import CATEGORIES, CategoryCode
 from app.models.transaction import Transaction
+from app.utils.cache import cached_per_user
 
 
 def to_object_id(user_id: PydanticObjectId) -> ObjectId:
@@ -15,41 +19,140 @@ def to_object_id(user_id: PydanticObjectId) -> ObjectId:
     return ObjectId(str(user_id))
 
 
-async def aggregate_transactions(pipeline: list[dict]) -> list[dict]:
-    """Run an aggregation pipeline on the Transaction collection."""
-    collection = Transaction.get_pymongo_collection()
-    cursor = collection.aggregate(pipeline)
-    return await cursor.to_list(length=None)
+@lru_cache(maxsize=16)
+def month_edges(year: int, month: int, months: int = 12) -> tuple[datetime, ...]:
+    """
+    Start of each of the `months` months ending at (year, month), followed by
+    the start of the next month as the closing edge.
+    """
+    edges = []
+    for k in range(months - 1, -2, -1):
+        y, m = divmod(month - 1 - k, 12)
+        edges.append(datetime(year + y, m + 1, 1))
+    return tuple(edges)
 
 
-async def get_carbon_total(
-    user_id: PydanticObjectId,
-    start_date: datetime = None,
-    end_date: datetime = None,
-    category: str = None,
-) -> float:
-    """Get total carbon emissions for a user with optional filters."""
-    match = {"user_id": to_object_id(user_id)}
+@lru_cache(maxsize=16)
+def month_labels(year: int, month: int, months: int = 12) -> tuple[str, ...]:
+    """Short month names ("Jan") matching month_edges, without the closing edge."""
+    return tuple(d.strftime("%b") for d in month_edges(year, month, months)[:-1])
+
+
+def week_edges(end: datetime, weeks: int = 12) -> list[datetime]:
+    """
+    Boundaries of the `weeks` rolling 7-day windows ending at `end`, oldest
+    first. Truncated to milliseconds, the precision Mongo stores dates at,
+    so $bucket ids compare equal to the edges.
+    """
+    end = end.replace(microsecond=end.microsecond // 1000 * 1000)
+    return [end - timedelta(weeks=weeks - k) for k in range(weeks + 1)]
+
+
+# Reusable pipeline stages
+CARBON_TOTAL_GROUP = {"$group": {"_id": None, "total": {"$sum": "$carbon"}}}
+
+# Only the fields CATEGORY_GROUP reads, so the planner can use the covering
+# (user_id, category, carbon, amount) index
+CATEGORY_PROJECT = {"$project": {"_id": 0, "category": 1, "carbon": 1, "amount": 1}}
+
+CATEGORY_GROUP = {"$group": {
+    "_id": "$category",
+    "carbon": {"$sum": "$carbon"},
+    "amount": {"$sum": "$amount"},
+    "count": {"$sum": 1}
+}}
+
+
+def carbon_buckets(edges: list[datetime]) -> list[dict]:
+    """Stages totalling carbon per [edges[k], edges[k+1]) date bucket."""
+    return [
+        {"$match": {"date": date_range(edges[0], edges[-1])}},
+        {"$bucket": {
+            "groupBy": "$date",
+            "boundaries": edges,
+            "output": {"total": {"$sum": "$carbon"}},
+        }},
+    ]
+
+
+def bucket_totals(rows: list[dict], edges: list[datetime]) -> list[float]:
+    """Carbon per bucket from carbon_buckets results (empty buckets are 0)."""
+    totals = {b["_id"]: b["total"] for b in rows}
+    return [totals.get(start, 0.0) for start in edges[:-1]]
+
+
+def date_range(start_date: datetime = None, end_date: datetime = None) -> dict:
+    """Build a half-open [start, end) `date` filter for a $match stage."""
+    date_filter = {}
+    if start_date:
+        date_filter["$gte"] = start_date
+    if end_date:
+        date_filter["$lt"] = end_date
+    return date_filter
+
+
+def first_total(rows: list[dict]) -> float:
+    """Read the total from a CARBON_TOTAL_GROUP result."""
+    return rows[0]["total"] if rows else 0.0
+
+
+def first_count(rows: list[dict]) -> int:
+    """Read the total from a `{"$count": "total"}` result."""
+    return rows[0]["total"] if rows else 0
+
+
+def summarize_categories(rows: list[dict]) -> list[dict]:
+    """
+    Format CATEGORY_GROUP results with rounded values and percentages,
+    ordered by carbon (highest first).
+    """
+    # Fixed-size accumulators indexed by CategoryCode
+    size = len(CategoryCode)
+    carbon = array("d", [0.0] * size)
+    amount = array("d", [0.0] * size)
+    count = array("q", [0] * size)
     
-    if start_date or end_date:
-        match["date"] = {}
-        if start_date:
-            match["date"]["$gte"] = start_date
-        if end_date:
-            match["date"]["$lt"] = end_date
+    for row in rows:
+        code = CategoryCode[row["_id"]]
+        carbon[code] = row["carbon"]
+        amount[code] = row["amount"]
+        count[code] = row["count"]
     
-    if category:
-        match["category"] = category
+    total = sum(carbon) or 1
+    order = sorted(
+        (code for code in range(size) if count[code]),
+        key=carbon.__getitem__,
+        reverse=True,
+    )
     
-    pipeline = [
-        {"$match": match},
-        {"$group": {"_id": None, "total": {"$sum": "$carbon"}}}
+    return [
+        {
+            "category": CATEGORIES[code],
+            "carbon": round(carbon[code], 2),
+            "amount": round(amount[code], 2),
+            "count": count[code],
+            "percentage": round((carbon[code] / total) * 100, 1),
+        }
+        for code in order
     ]
-    
-    result = await aggregate_transactions(pipeline)
-    return result[0]["total"] if result else 0.0
 
 
+# Safety ceiling on buffered aggregation results, and cursor batch size
+AGGREGATION_RESULT_LIMIT = 10_000
+AGGREGATION_BATCH_SIZE = 1_000
+
+
+async def aggregate_transactions(
+    pipeline: list[dict],
+    limit: int = AGGREGATION_RESULT_LIMIT,
+) -> list[dict]:
+    """Run an aggregation pipeline on the Transaction collection."""
+    collection = Transaction.get_pymongo_collection()
+    cursor = collection.aggregate(pipeline, batchSize=AGGREGATION_BATCH_SIZE)
+    return await cursor.to_list(length=limit)
+
+
+@cached_per_user(maxsize=1024, ttl=60)
 async def get_category_breakdown(
     user_id: PydanticObjectId,
     start_date: datetime = None,
@@ -59,63 +162,76 @@ async def get_category_breakdown(
     match = {"user_id": to_object_id(user_id)}
     
     if start_date or end_date:
-        match["date"] = {}
-        if start_date:
-            match["date"]["$gte"] = start_date
-        if end_date:
-            match["date"]["$lt"] = end_date
+        match["date"] = date_range(start_date, end_date)
     
     pipeline = [
         {"$match": match},
-        {"$group": {
-            "_id": "$category",
-            "carbon": {"$sum": "$carbon"},
-            "amount": {"$sum": "$amount"},
-            "count": {"$sum": 1}
-        }}
+        CATEGORY_PROJECT,
+        CATEGORY_GROUP,
     ]
     
-    result = await aggregate_transactions(pipeline)
-    total = sum(c["carbon"] for c in result) or 1
-    
-    return [
-        {
-            "category": c["_id"],
-            "carbon": round(c["carbon"], 2),
-            "amount": round(c["amount"], 2),
-            "count": c["count"],
-            "percentage": round((c["carbon"] / total) * 100, 1),
-        }
-        for c in result
-    ]
+    return summarize_categories(await aggregate_transactions(pipeline))
 
 
-async def get_tracking_streak(user_id: PydanticObjectId) -> int:
+async def get_progress_bundle(user_id: PydanticObjectId, now: datetime) -> dict:
     """
-    Calculate user's engagement score based on tracked days.
-    For uploaded historical data, we count unique days with transactions
-    as a measure of tracking consistency.
+    Every /progress metric in one aggregation over the user's transactions:
+    week and month totals (current and previous), all-time category
+    breakdown, 12-week history, and transaction/day/import counts.
     """
+    week_start = now - timedelta(days=now.weekday())
+    last_week_start = week_start - timedelta(days=7)
+    last_month_start, month_start = month_edges(now.year, now.month, 2)[:2]
+    history_edges = week_edges(now)
+    
     pipeline = [
         {"$match": {"user_id": to_object_id(user_id)}},
-        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}}},
-        {"$count": "total_days"}
+        {"$project": {"_id": 0, "date": 1, "category": 1, "carbon": 1, "amount": 1, "source": 1}},
+        {"$facet": {
+            "week": [
+                {"$match": {"date": date_range(week_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "last_week": [
+                {"$match": {"date": date_range(last_week_start, week_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "month": [
+                {"$match": {"date": date_range(month_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "last_month": [
+                {"$match": {"date": date_range(last_month_start, month_start)}},
+                CARBON_TOTAL_GROUP,
+            ],
+            "categories": [CATEGORY_GROUP],
+            "history": carbon_buckets(history_edges),
+            "counts": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "imported": {"$sum": {"$cond": [{"$eq": ["$source", "import"]}, 1, 0]}},
+            }}],
+            "unique_days": [
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}}},
+                {"$count": "total"},
+            ],
+        }},
     ]
+    facets = (await aggregate_transactions(pipeline))[0]
     
-    result = await aggregate_transactions(pipeline)
-    return result[0]["total_days"] if result else 0
-
-
-async def get_transaction_count(user_id: PydanticObjectId) -> int:
-    """Get total transaction count for a user."""
-    return await Transaction.find(Transaction.user_id == user_id).count()
-
-
-async def get_import_count(user_id: PydanticObjectId) -> int:
-    """Get count of imported transactions (for bonus XP)."""
-    pipeline = [
-        {"$match": {"user_id": to_object_id(user_id), "source": "import"}},
-        {"$count": "total"}
-    ]
-    result = await aggregate_transactions(pipeline)
-    return result[0]["total"] if result else 0
+    history = bucket_totals(facets["history"], history_edges)
+    counts = facets["counts"][0] if facets["counts"] else {"total": 0, "imported": 0}
+    return {
+        "week_carbon": first_total(facets["week"]),
+        "last_week_carbon": first_total(facets["last_week"]),
+        "month_carbon": first_total(facets["month"]),
+        "last_month_carbon": first_total(facets["last_month"]),
+        "categories": summarize_categories(facets["categories"]),
+        "history": [
+            {"start": start, "carbon": carbon}
+            for start, carbon in zip(history_edges, history)
+        ],
+        "total_transactions": counts["total"],
+        "days_tracked": first_count(facets["unique_days"]),
+        "import_count": counts["imported"],
+    }
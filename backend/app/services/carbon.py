@@ -3,17 +3,22 @@ Carbon calculation and transaction categorization service.
 Handles all carbon emission calculations and transaction classification.
 """
 
-import re
 import os
+import threading
+from functools import lru_cache
 from typing import Optional
 import logging
 
+import numpy as np
+
 from app.constants import (
     CARBON_FACTORS,
-    MERCHANT_FACTORS,
-    CATEGORY_KEYWORDS,
-    IGNORE_KEYWORDS,
+    ALL_MERCHANT_KEYS,
+    ALL_MERCHANT_FACTORS,
+    CATEGORY_KEYWORD_SETS,
+    IGNORE_REGEX,
     CATEGORIES,
+    KEYWORD_AUTOMATON,
     Category,
 )
 
@@ -25,17 +30,39 @@ logger = logging.getLogger(__name__)
 
 _ml_model = None
 _model_loaded = False
+_model_lock = threading.Lock()
+
+# Where the model file was found, so retries skip the search
+_model_path = None
+
+# Read errors may be transient (e.g. file being replaced); retry a few times
+_load_attempts = 0
+MAX_MODEL_LOAD_ATTEMPTS = 3
 
 
 def _load_ml_model():
     """Load the ML model for transaction categorization (lazy loading)."""
-    global _ml_model, _model_loaded
+    global _ml_model, _model_loaded, _load_attempts
     
     if _model_loaded:
         return _ml_model
     
-    _model_loaded = True
+    # Only one thread loads; others wait and reuse its result
+    with _model_lock:
+        if not _model_loaded:
+            _load_attempts += 1
+            try:
+                _ml_model = _read_ml_model()
+                _model_loaded = True
+            except (OSError, EOFError) as e:
+                logger.warning(f"Failed to read ML model (attempt {_load_attempts}): {e}")
+                _model_loaded = _load_attempts >= MAX_MODEL_LOAD_ATTEMPTS
     
+    return _ml_model
+
+
+def _find_model_path() -> Optional[str]:
+    """Locate transaction_classifier.pkl, or None if it doesn't exist."""
     # Try multiple paths for the model file
     possible_paths = [
         os.path.join(os.path.dirname(__file__), "transaction_classifier.pkl"),
@@ -43,24 +70,85 @@ def _load_ml_model():
         os.path.join(os.path.dirname(__file__), "..", "..", "transaction_classifier.pkl"),
         "transaction_classifier.pkl",
     ]
+    return next((path for path in possible_paths if os.path.exists(path)), None)
+
+
+def _read_ml_model():
+    """
+    Unpickle the model file, or return None if it can't be used.
+    Raises OSError/EOFError on read failures (e.g. a file mid-copy), which
+    are worth retrying.
+    """
+    global _model_path
     
     try:
         import joblib
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                _ml_model = joblib.load(path)
-                logger.info(f"✓ ML categorization model loaded from {path}")
-                return _ml_model
-        
-        logger.warning("ML model file (transaction_classifier.pkl) not found. Using rule-based only.")
-        
     except ImportError:
         logger.warning("joblib not installed. ML categorization disabled. Install with: pip install joblib")
+        return None
+    
+    if _model_path is None:
+        _model_path = _find_model_path()
+    if _model_path is None:
+        logger.warning("ML model file (transaction_classifier.pkl) not found. Using rule-based only.")
+        return None
+    
+    try:
+        # Memory-map the model's arrays so worker processes share
+        # the file's pages instead of each holding a copy
+        model = joblib.load(_model_path, mmap_mode="r")
+    except (OSError, EOFError):
+        raise
     except Exception as e:
         logger.warning(f"Failed to load ML model: {e}")
+        return None
     
-    return None
+    logger.info(f"✓ ML categorization model loaded from {_model_path}")
+    return model
+
+
+def preload_ml_model() -> None:
+    """Load the ML model ahead of the first request that needs it."""
+    _load_ml_model()
+
+
+# Canonical category for each lowercased spelling the model may return
+_CATEGORY_BY_LOWER = {cat.lower(): cat for cat in CATEGORIES}
+
+
+def _validate_prediction(prediction) -> Optional[Category]:
+    """Map a raw model prediction to one of CATEGORIES, or None."""
+    category = _CATEGORY_BY_LOWER.get(str(prediction).lower())
+    if category is None:
+        logger.debug(f"ML prediction '{prediction}' not in valid categories")
+    return category
+
+
+def predict_categories_ml(texts: list[str]) -> list[Optional[Category]]:
+    """
+    Use ML model to predict categories for many transactions in one call.
+    
+    Args:
+        texts: Transaction names/descriptions
+    
+    Returns:
+        Predicted category per text, None where prediction fails or is invalid
+    """
+    model = _load_ml_model()
+    
+    if model is None or not texts:
+        return [None] * len(texts)
+    
+    try:
+        predictions = model.predict([text.lower() for text in texts])
+    except Exception as e:
+        if len(texts) == 1:
+            logger.debug(f"ML prediction failed for '{texts[0]}': {e}")
+            return [None]
+        # Retry one at a time so a single bad text doesn't fail the batch
+        return [predict_category_ml(text) for text in texts]
+    
+    return [_validate_prediction(prediction) for prediction in predictions]
 
 
 def predict_category_ml(text: str) -> Optional[Category]:
@@ -73,30 +161,64 @@ def predict_category_ml(text: str) -> Optional[Category]:
     Returns:
         Predicted category, or None if prediction fails or is invalid
     """
-    model = _load_ml_model()
+    return predict_categories_ml([text])[0]
+
+
+# =============================================================================
+# Keyword Matching
+# =============================================================================
+
+@lru_cache(maxsize=8192)
+def _scan_keywords(text: str) -> tuple[bool, Optional[Category], Optional[float]]:
+    """
+    One KEYWORD_AUTOMATON pass over lowercased text, returning (ignored,
+    category, merchant_factor) with first-match precedence for each. Cached,
+    so categorizing a name and then pricing it scans the text once.
+    """
+    ignored = False
+    category = factor = None
+    category_best = merchant_best = None
     
-    if model is None:
-        return None
+    for _, payload in KEYWORD_AUTOMATON.iter(text):
+        category_rank, keyword_category, merchant_rank, merchant_factor, is_ignored = payload
+        ignored = ignored or is_ignored
+        if category_rank is not None and (category_best is None or category_rank < category_best):
+            category_best, category = category_rank, keyword_category
+        if merchant_rank is not None and (merchant_best is None or merchant_rank < merchant_best):
+            merchant_best, factor = merchant_rank, merchant_factor
     
-    try:
-        prediction = model.predict([text.lower()])[0]
-        
-        # Validate prediction is a valid category
-        if prediction in CATEGORIES:
-            return prediction
-        
-        # Try to map common variations
-        prediction_lower = str(prediction).lower()
-        for cat in CATEGORIES:
-            if cat.lower() == prediction_lower:
-                return cat
-        
-        logger.debug(f"ML prediction '{prediction}' not in valid categories")
-        return None
-        
-    except Exception as e:
-        logger.debug(f"ML prediction failed for '{text}': {e}")
-        return None
+    return ignored, category, factor
+
+
+def _match_merchant_factor(text: str) -> Optional[float]:
+    """Return the factor of the first MERCHANT_FACTORS key found in lowercased text."""
+    if KEYWORD_AUTOMATON is not None:
+        return _scan_keywords(text)[2]
+    
+    for merchant_key, factor in zip(ALL_MERCHANT_KEYS, ALL_MERCHANT_FACTORS):
+        if merchant_key in text:
+            return factor
+    return None
+
+
+def _match_category(text: str) -> tuple[bool, Optional[Category]]:
+    """
+    Scan lowercased text for keywords. Returns (ignored, category): whether
+    it contains an ignore keyword, and otherwise the first category whose
+    keywords appear.
+    """
+    if KEYWORD_AUTOMATON is not None:
+        ignored, category, _ = _scan_keywords(text)
+        return ignored, None if ignored else category
+    
+    if IGNORE_REGEX.search(text):
+        return True, None
+    
+    for category, keywords in CATEGORY_KEYWORD_SETS.items():
+        for keyword in keywords:
+            if keyword in text:
+                return False, category
+    return False, None
 
 
 def calculate_carbon(amount: float, category: str, merchant_name: str = "") -> float:
@@ -114,18 +236,56 @@ def calculate_carbon(amount: float, category: str, merchant_name: str = "") -> f
     if amount <= 0:
         return 0.0
     
-    merchant_lower = merchant_name.lower()
-    
     # Try merchant-specific factor first
-    for merchant_key, factor in MERCHANT_FACTORS.items():
-        if merchant_key in merchant_lower:
-            return round(amount * factor, 2)
+    factor = _match_merchant_factor(merchant_name.lower())
+    if factor is not None:
+        return round(amount * factor, 2)
     
     # Fall back to category-based calculation
     factor = CARBON_FACTORS.get(category, 0.0015)
     return round(amount * factor, 2)
 
 
+def calculate_carbon_batch(
+    amounts: np.ndarray,
+    categories: list[str],
+    merchant_names: list[str],
+) -> list[float]:
+    """
+    Calculate carbon emissions for many transactions at once.
+    
+    Same result per row as calculate_carbon: factors are looked up once per
+    distinct merchant name and category, and multiplied in one array
+    operation. Rounding stays Python's round, since np.round can differ from
+    it by 0.01 and imported rows should match manually added ones.
+    
+    Args:
+        amounts: Transaction amounts in INR
+        categories: Category of each transaction
+        merchant_names: Merchant name of each transaction
+    
+    Returns:
+        Estimated CO2 emissions in kg per transaction
+    """
+    # Scan the same text categorize_transactions does, so imports reuse its
+    # cached keyword scan (merchant keys never end in a space, so the
+    # trailing one doesn't change the match)
+    merchant_factors = {name: _match_merchant_factor(f"{name} ".lower()) for name in set(merchant_names)}
+    factors = np.fromiter(
+        (
+            merchant_factors[name] if merchant_factors[name] is not None
+            else CARBON_FACTORS.get(category, 0.0015)
+            for name, category in zip(merchant_names, categories)
+        ),
+        dtype=np.float64,
+        count=len(merchant_names),
+    )
+    
+    amounts = np.asarray(amounts, dtype=np.float64)
+    emissions = np.where(amounts > 0, amounts * factors, 0.0)
+    return [round(carbon, 2) for carbon in emissions.tolist()]
+
+
 def categorize_transaction(merchant_name: str, description: str = "") -> Optional[Category]:
     """
     Categorize a transaction based on merchant name and description.
@@ -138,28 +298,74 @@ def categorize_transaction(merchant_name: str, description: str = "") -> Optiona
     Returns:
         Category string, or None if transaction should be ignored
     """
-    text = f"{merchant_name} {description}".lower()
-    
-    # Check if this should be ignored (P2P transfers, banking ops, etc.)
-    for keyword in IGNORE_KEYWORDS:
-        if keyword in text:
-            return None
-    
-    # Check each category's keywords (rule-based)
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text:
-                return category
+    return _categorize_text(f"{merchant_name} {description}".lower())
+
+
+@lru_cache(maxsize=8192)
+def _categorize_text(text: str) -> Optional[Category]:
+    """
+    Categorize lowercased merchant/description text. Cached, since statements
+    repeat the same merchants across months.
+    """
+    # Ignore keywords (P2P transfers, banking ops, etc.) and each category's
+    # keywords (rule-based), in one scan
+    ignored, category = _match_category(text)
+    if ignored:
+        return None
+    if category:
+        return category
     
     # Fallback to ML model if rule-based didn't match
     ml_prediction = predict_category_ml(text)
     if ml_prediction:
-        logger.debug(f"ML categorized '{merchant_name}' as '{ml_prediction}'")
+        logger.debug(f"ML categorized '{text.strip()}' as '{ml_prediction}'")
         return ml_prediction
     
     return None
 
 
+def categorize_transactions(merchant_names: list[str]) -> list[Optional[Category]]:
+    """
+    Categorize many transactions by merchant name, like categorize_transaction
+    but with the ML fallback for all rule-based misses run as one batch.
+    """
+    results = []
+    misses = []
+    
+    for i, merchant_name in enumerate(merchant_names):
+        text = f"{merchant_name} ".lower()  # as categorize_transaction with no description
+        ignored, category = _match_category(text)
+        if not ignored and category is None:
+            misses.append((i, text))
+        results.append(category)
+    
+    if misses:
+        predictions = predict_categories_ml([text for _, text in misses])
+        for (i, _), prediction in zip(misses, predictions):
+            results[i] = prediction
+    
+    return results
+
+
+# Name cleanup tables
+UPI_PREFIXES = ("upi-", "upi/")
+BANK_SUFFIXES = (
+    "payu", "paytm", "razorpay", "phonepe", "gpay", "bhim",
+    "yesbank", "hdfcbank", "icici", "sbi", "axis",
+)
+NAME_DELIMITERS = str.maketrans("-_.", "   ")
+
+
+def _strip_bank_suffix(name: str) -> str:
+    """Drop a trailing bank/payment platform name and one separator before it."""
+    for suffix in BANK_SUFFIXES:
+        if name[-len(suffix):].lower() == suffix:
+            name = name[:-len(suffix)]
+            return name[:-1] if name[-1:] in ".-_" else name
+    return name
+
+
+@lru_cache(maxsize=8192)
 def clean_transaction_name(raw_name: str) -> str:
     """
     Clean up transaction names for readability.
@@ -174,19 +380,19 @@ def clean_transaction_name(raw_name: str) -> str:
     name = raw_name.strip()
     
     # Remove UPI prefix
-    name = re.sub(r'^UPI[-/]', '', name, flags=re.IGNORECASE)
+    if name[:4].lower() in UPI_PREFIXES:
+        name = name[4:]
     
     # Remove @handle patterns
-    if '@' in name:
-        name = name.split('@')[0]
+    at = name.find('@')
+    if at >= 0:
+        name = name[:at]
     
     # Remove bank/payment platform suffixes
-    bank_patterns = r'[.\-_]?(PAYU|PAYTM|RAZORPAY|PHONEPE|GPAY|BHIM|YESBANK|HDFCBANK|ICICI|SBI|AXIS)$'
-    name = re.sub(bank_patterns, '', name, flags=re.IGNORECASE)
+    name = _strip_bank_suffix(name)
     
     # Split into parts and clean
-    parts = re.split(r'[-_.\s]+', name)
-    parts = [p for p in parts if p and not p.isdigit()]
+    parts = [p for p in name.translate(NAME_DELIMITERS).split() if not p.isdigit()]
     
     # Remove consecutive duplicates
     cleaned_parts = []
@@ -3,6 +3,7 @@ from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from beanie import PydanticObjectId
 
@@ -30,6 +31,16 @@ def hash_password(password: str) -> str:
     ).decode('utf-8')
 
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in a worker thread so bcrypt doesn't block the event loop."""
+    return await run_in_threadpool(verify_password, plain_password, hashed_password)
+
+
+async def ahash_password(password: str) -> str:
+    """Hash a password in a worker thread so bcrypt doesn't block the event loop."""
+    return await run_in_threadpool(hash_password, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
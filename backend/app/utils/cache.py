@@ -0,0 +1,86 @@
+"""
+In-process TTL caches for per-user query results.
+Entries are keyed by user id first so transaction writes can drop them.
+"""
+
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Hashable
+
+
+# Every cache created, so a user's entries can be dropped everywhere at once
+_caches: list["TTLCache"] = []
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        _caches.append(self)
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        """Return (hit, value) for a key, evicting it if expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: tuple, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_key: Hashable) -> None:
+        """Drop every entry whose key starts with the given user key."""
+        for key in [k for k in self._entries if k[0] == user_key]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._entries.clear()
+
+
+def cached_per_user(maxsize: int = 1024, ttl: float = 60):
+    """
+    Cache an async function whose first argument is a user id.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+        @wraps(func)
+        async def wrapper(user_id, *args, **kwargs):
+            key = (str(user_id), args, tuple(sorted(kwargs.items())))
+            hit, value = cache.get(key)
+            if hit:
+                return value
+
+            value = await func(user_id, *args, **kwargs)
+            cache.set(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def invalidate_user_cache(user_id) -> None:
+    """Drop all cached results for a user (call after transaction writes)."""
+    user_key = str(user_id)
+    for cache in _caches:
+        cache.invalidate_user(user_key)